@@ -0,0 +1,22 @@
+import secrets
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+
+from .config import settings
+
+
+async def require_admin(request: Request) -> None:
+    """
+    Guard for admin endpoints.
+    - Disabled (404) unless ADMIN_TOKEN is configured.
+    - Requires a matching x-admin-token header (403 otherwise).
+    :param request: Incoming HTTP request.
+    :raises HTTPException: 404 if admin is disabled, 403 if the token is missing or wrong.
+    """
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="admin disabled")
+    token = request.headers.get("x-admin-token") or ""
+    if not secrets.compare_digest(token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="forbidden")
+
+admin_router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
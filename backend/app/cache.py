@@ -0,0 +1,37 @@
+from typing import Dict, Optional
+
+
+class VersionedCache:
+    """
+    Small byte cache whose entries are only valid for one source version.
+    Storing a value under a newer version drops everything cached for older ones.
+    """
+    def __init__(self, max_entries: int = 64) -> None:
+        self._max_entries = max_entries
+        self._version: Optional[int] = None
+        self._entries: Dict[str, bytes] = {}
+
+    def get(self, version: int, key: str) -> Optional[bytes]:
+        """
+        Return the cached value for ``key`` if it was stored at ``version``.
+        :param version: Current source version.
+        :param key: Cache key, e.g. the request query string.
+        """
+        if version != self._version:
+            return None
+        return self._entries.get(key)
+
+    def put(self, version: int, key: str, value: bytes) -> None:
+        """
+        Cache ``value`` for ``key`` at ``version``; the oldest key is evicted when full.
+        """
+        if version != self._version:
+            self._version = version
+            self._entries.clear()
+        if key not in self._entries and len(self._entries) >= self._max_entries:
+            del self._entries[next(iter(self._entries))]
+        self._entries[key] = value
+
+    def clear(self) -> None:
+        self._version = None
+        self._entries.clear()
@@ -15,8 +15,20 @@ class Settings(BaseSettings):
     REQUEST_TIMEOUT_SEC: int = 30
     ENABLE_METRICS: bool = True
     ENABLE_TLS: bool = False
+    ENABLE_TRACING: bool = True
+    TRACE_BUFFER_SIZE: int = 256
+    TRACE_EXPORT_PATH: str = ""  # JSON-lines span file; empty disables
+    ADMIN_TOKEN: str = ""  # empty disables /admin endpoints
+    PROFILE_MAX_SECONDS: int = 60
+    ENABLE_LOOP_LAG_MONITOR: bool = False
+    LOOP_LAG_THRESHOLD_MS: int = 100
 
     FILE_BACKEND: str = "memory"
+    SEGMENT_DIR: str = "data"
+    SEGMENT_MAX_BYTES: int = 64 * 1024 * 1024  # 64MB
+    SEGMENT_INLINE_MAX_BYTES: int = 256 * 1024  # larger blobs get their own file
+    SEGMENT_COMPACT_RATIO: float = 0.5
+    SEGMENT_COMPACT_INTERVAL_SEC: int = 30
     FEATURE_REQUIRE_CSRF_HEADER: bool = False
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
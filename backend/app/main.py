@@ -2,26 +2,82 @@ import asyncio
 import logging
 import os
 import secrets
-from typing import Awaitable, Callable
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
 
-from fastapi import APIRouter, FastAPI, File, HTTPException, Request, Response, UploadFile
+from fastapi import (
+    APIRouter,
+    FastAPI,
+    File,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, PlainTextResponse
 from werkzeug.utils import secure_filename
 
+from .admin import admin_router
+from .cache import VersionedCache
 from .config import settings
 from .exceptions import json_exception_handler
 from .logging import configure_logging
 from .metrics import metrics
 from .middlewares import RequestContextMiddleware
-from .models import FileListResponse, FileMeta, UploadResponse
-from .storage import IFileStore, make_store
+from .models import (
+    SHA256_PATTERN,
+    DigestProbeRequest,
+    DigestProbeResponse,
+    FileListResponse,
+    FileMeta,
+    LinkRequest,
+    UploadResponse,
+)
+from .profiling import CpuProfiler, HeapTracker, LoopLagMonitor
+from .segments import SegmentStore
+from .storage import FileInfo, IFileStore, StoredFile, make_store
+from .tracing import JsonLinesExporter, RingBufferExporter, current_span, tracer
 
 configure_logging()
+_T = TypeVar("_T")
 logger = logging.getLogger("app")
 dedupe_lock = asyncio.Lock()
-app = FastAPI(title="File Upload API", version=settings.API_VERSION)
 store: IFileStore = make_store(settings.FILE_BACKEND)
+listing_cache = VersionedCache()
+# store versions restart with the process, so salt ETags to keep them unique across restarts
+listing_etag_salt = secrets.token_hex(4)
+trace_buffer = RingBufferExporter(settings.TRACE_BUFFER_SIZE)
+if settings.ENABLE_TRACING:
+    tracer.add_exporter(trace_buffer)
+trace_file_exporter: JsonLinesExporter | None = None
+if settings.ENABLE_TRACING and settings.TRACE_EXPORT_PATH:
+    trace_file_exporter = JsonLinesExporter(settings.TRACE_EXPORT_PATH)
+    tracer.add_exporter(trace_file_exporter)
+cpu_profiler = CpuProfiler()
+heap_tracker = HeapTracker()
+loop_lag_monitor = LoopLagMonitor(threshold_s=settings.LOOP_LAG_THRESHOLD_MS / 1000)
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    """Run background store maintenance and the loop lag monitor for the app's lifetime."""
+    if isinstance(store, SegmentStore):
+        store.start_compactor()
+    if settings.ENABLE_LOOP_LAG_MONITOR:
+        loop_lag_monitor.start()
+    try:
+        yield
+    finally:
+        await loop_lag_monitor.stop()
+        if trace_file_exporter is not None:
+            await asyncio.to_thread(trace_file_exporter.close)
+        if isinstance(store, SegmentStore):
+            await store.aclose()
+
+app = FastAPI(title="File Upload API", version=settings.API_VERSION, lifespan=lifespan)
 api_router = APIRouter(prefix=settings.API_PREFIX)
 upload_semaphore = asyncio.Semaphore(settings.CONCURRENT_UPLOAD_LIMIT)
 
@@ -35,6 +91,8 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    # let browser clients honour backpressure and correlate requests
+    expose_headers=["Retry-After", "x-request-id", "traceparent"],
 )
 @api_router.options("/{path:path}")
 async def options_catchall() -> Response:
@@ -97,24 +155,94 @@ async def get_metrics() -> JSONResponse:
         "ok": True,
         "uploads_total": metrics.counters.uploads_total,
         "upload_bytes_sum": metrics.counters.upload_bytes_sum,
+        "links_total": metrics.counters.links_total,
         "requests_in_progress": metrics.gauges.requests_in_progress,
         "queue_len": metrics.gauges.queue_len,
         "uptime_s": metrics.uptime_s(),
     })
 
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match header against an ETag.
+    :param if_none_match: Raw header value (may list several tags, or be "*").
+    :param etag: Current ETag.
+    :return: True if the client's copy is current.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
 @api_router.get("/files", response_model=FileListResponse)
-async def list_files(response: Response) -> FileListResponse:
+async def list_files(request: Request) -> Response:
     """
-    List all uploaded files in memory.
-    :param response: FastAPI response for adding headers.
-    :return: FileListResponse model with metadata for all files.
+    List all uploaded files.
+    - Weak ETag derived from the store version; matching If-None-Match gets 304.
+    - Serialized listings are cached per store version and query until the next write.
+    :param request: Incoming request, for If-None-Match and the cache key.
+    :return: JSON FileListResponse body, or an empty 304.
     """
-    api_version_header(response)
-    files = await store.list()
-    return FileListResponse(files=[
-        FileMeta(name=f.name, size=f.size, content_type=f.content_type, uploaded_at=f.uploaded_at)
-        for f in files
-    ])
+    # read the version before listing so the body is never older than its ETag
+    version = store.version
+    etag = f'W/"{listing_etag_salt}-{version}"'
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        resp = Response(status_code=304)
+    else:
+        key = request.url.query
+        body = listing_cache.get(version, key)
+        if body is None:
+            files = await store.list_info()
+            listing = FileListResponse(files=[_file_meta(f) for f in files])
+            body = listing.model_dump_json().encode()
+            listing_cache.put(version, key, body)
+        resp = Response(content=body, media_type="application/json")
+    resp.headers["etag"] = etag
+    resp.headers["cache-control"] = "no-cache"
+    api_version_header(resp)
+    return resp
+
+def _file_meta(f: FileInfo | StoredFile) -> FileMeta:
+    """
+    Build the public metadata model for a stored file.
+    :param f: FileInfo or StoredFile from the store.
+    :return: FileMeta without the file contents.
+    """
+    return FileMeta(name=f.name, size=f.size, content_type=f.content_type,
+                    uploaded_at=f.uploaded_at, sha256=f.sha256 or None)
+
+def _require_csrf(request: Request) -> None:
+    """
+    Enforce the CSRF header when FEATURE_REQUIRE_CSRF_HEADER is on.
+    :raises HTTPException: 400 if the header is missing.
+    """
+    if settings.FEATURE_REQUIRE_CSRF_HEADER:
+        if request.headers.get("x-csrf-token") is None:
+            raise HTTPException(status_code=400, detail="missing csrf header")
+
+async def _store_unique(safe_name: str, store_op: Callable[[str], Awaitable[_T]]) -> _T:
+    """
+    Allocate a unique name from ``safe_name`` (appending a short random suffix until
+    unused) and run ``store_op`` with it, all inside the short dedupe_lock critical section.
+    :param safe_name: Sanitized requested name.
+    :param store_op: Coroutine function creating the file under the allocated name.
+    :return: Whatever ``store_op`` returns.
+    """
+    name_root, name_ext = os.path.splitext(safe_name)
+    with tracer.span("upload.dedupe_lock_wait"):
+        await dedupe_lock.acquire()
+    try:
+        with tracer.span("upload.allocate_name"):
+            candidate = safe_name
+            # probe store for collision; append short random suffix until unique
+            while await store.exists(candidate):
+                suffix = secrets.token_hex(3)  # 6 hex chars
+                candidate = f"{name_root}_{suffix}{name_ext}"
+
+        return await store_op(candidate)
+    finally:
+        dedupe_lock.release()
 
 @api_router.post("/upload", response_model=UploadResponse)
 async def upload_file(
@@ -124,10 +252,12 @@ async def upload_file(
 ) -> UploadResponse | JSONResponse:
     """Upload file with concurrency limits, metrics, safety checks, and deduping."""
     api_version_header(response)
+    # the multipart body has already been parsed by the time the handler runs
+    request_span = current_span.get()
+    if request_span is not None:
+        tracer.record("upload.receive_multipart", request_span.start, time.time())
 
-    if settings.FEATURE_REQUIRE_CSRF_HEADER:
-        if request.headers.get("x-csrf-token") is None:
-            raise HTTPException(status_code=400, detail="missing csrf header")
+    _require_csrf(request)
 
     # backpressure
     if upload_semaphore.locked() and upload_semaphore._value <= 0:
@@ -144,36 +274,73 @@ async def upload_file(
     if not safe_name:
         raise HTTPException(status_code=400, detail="invalid filename")
 
-    name_root, name_ext = os.path.splitext(safe_name)
-
-    async with upload_semaphore:
+    with tracer.span("upload.semaphore_wait"):
+        await upload_semaphore.acquire()
+    try:
         # reflect queued capacity
         await metrics.set_queue_len(settings.CONCURRENT_UPLOAD_LIMIT - upload_semaphore._value)
 
         # read stream with size/time bounds before we grab the short critical section
-        data = await _read_stream_with_timeout(
-            file, settings.MAX_UPLOAD_SIZE_BYTES, settings.REQUEST_TIMEOUT_SEC
-        )
+        with tracer.span("upload.read_stream") as sp:
+            data = await _read_stream_with_timeout(
+                file, settings.MAX_UPLOAD_SIZE_BYTES, settings.REQUEST_TIMEOUT_SEC
+            )
+            sp.attributes["bytes"] = len(data)
         content_type = file.content_type or "application/octet-stream"
 
         # short critical section: allocate a unique name then save
-        async with dedupe_lock:
-            candidate = safe_name
-            # probe store for collision; append short random suffix until unique
-            while (await store.get(candidate)) is not None:
-                suffix = secrets.token_hex(3)  # 6 hex chars
-                candidate = f"{name_root}_{suffix}{name_ext}"
+        async def _save(candidate: str) -> StoredFile:
+            with tracer.span("store.save", bytes=len(data)):
+                return await store.save(candidate, content_type, data)
 
-            saved = await store.save(candidate, content_type, data)
+        saved = await _store_unique(safe_name, _save)
 
         await metrics.inc_uploads(len(data))
-        meta = FileMeta(
-            name=saved.name,
-            size=saved.size,
-            content_type=saved.content_type,
-            uploaded_at=saved.uploaded_at,
-        )
-        return UploadResponse(file=meta)
+        return UploadResponse(file=_file_meta(saved))
+    finally:
+        upload_semaphore.release()
+
+@api_router.post("/files/probe", response_model=DigestProbeResponse)
+async def probe_digests(body: DigestProbeRequest, response: Response) -> DigestProbeResponse:
+    """
+    Report which SHA-256 digests the server already stores, so clients can skip uploads.
+    :param body: Hex digests to check.
+    :return: DigestProbeResponse with the subset that is present.
+    """
+    api_version_header(response)
+    digests = [d.lower() for d in body.digests]
+    return DigestProbeResponse(present=await store.has_digests(digests))
+
+@api_router.head("/blobs/{sha256}")
+async def head_blob(sha256: str = Path(pattern=SHA256_PATTERN)) -> Response:
+    """Single-digest probe: 200 if content with this SHA-256 is stored, else 404."""
+    present = await store.has_digests([sha256])
+    return Response(status_code=200 if present else 404)
+
+@api_router.post("/files/link", response_model=UploadResponse)
+async def link_file(body: LinkRequest, response: Response, request: Request) -> UploadResponse:
+    """
+    Create a file from content the server already holds, without a body transfer.
+    - Name is sanitized and deduplicated like an upload.
+    - 404 if no stored file has the given SHA-256.
+    """
+    api_version_header(response)
+    _require_csrf(request)
+    safe_name = secure_filename(body.name)
+    if not safe_name:
+        raise HTTPException(status_code=400, detail="invalid filename")
+
+    async def _link(candidate: str) -> FileInfo | None:
+        with tracer.span("store.link") as sp:
+            info = await store.link(candidate, body.sha256, body.content_type)
+            sp.attributes["hit"] = info is not None
+            return info
+
+    saved = await _store_unique(safe_name, _link)
+    if saved is None:
+        raise HTTPException(status_code=404, detail="content not found")
+    await metrics.inc_links()
+    return UploadResponse(file=_file_meta(saved))
 
 @api_router.get("/files/{name}")
 async def download_file(name: str) -> Response:
@@ -183,11 +350,111 @@ async def download_file(name: str) -> Response:
     - Returns Content-Disposition: attachment.
     """
     safe_name = secure_filename(name)
-    f = await store.get(safe_name)
+    with tracer.span("store.get") as sp:
+        f = await store.get(safe_name)
+        sp.attributes["hit"] = f is not None
     if f is None:
         raise HTTPException(status_code=404, detail="file not found")
-    headers = {
-        "Content-Disposition": f'attachment; filename="{safe_name}"'
-    }
-    return Response(content=f.data, media_type=f.content_type, headers=headers)
+    with tracer.span("download.build_response", bytes=f.size):
+        headers = {
+            "Content-Disposition": f'attachment; filename="{safe_name}"'
+        }
+        return Response(content=f.data, media_type=f.content_type, headers=headers)
+
+@admin_router.get("/traces")
+async def get_traces(min_duration_ms: float = 0.0, limit: int = 20) -> JSONResponse:
+    """
+    Return recent traces from the in-memory buffer, slowest first.
+    :param min_duration_ms: Only include traces whose request span took at least this long.
+    :param limit: Maximum number of traces returned.
+    """
+    if not settings.ENABLE_TRACING:
+        return JSONResponse({"ok": False, "error": "tracing_disabled"}, status_code=404)
+    traces = trace_buffer.slowest(min_duration_ms=min_duration_ms, limit=max(limit, 0))
+    return JSONResponse({
+        "ok": True,
+        "traces": [
+            {
+                "trace_id": t[0].context.trace_id,
+                "name": t[0].name,
+                "duration_ms": round(t[0].duration_ms, 3),
+                "spans": [s.to_dict() for s in t],
+            }
+            for t in traces
+        ],
+    })
+
+@admin_router.get("/profile/cpu")
+async def profile_cpu(
+    seconds: float = Query(5.0, gt=0),
+    interval_ms: float = Query(5.0, ge=1),
+) -> Response:
+    """
+    Sample the event loop thread for a number of seconds.
+    :return: Collapsed stacks ("frame;frame;frame count" per line) for flamegraph tools.
+    """
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail="profile too long")
+    if cpu_profiler.busy:
+        raise HTTPException(status_code=409, detail="profile already running")
+    text = await cpu_profiler.profile(seconds, interval_ms / 1000)
+    return PlainTextResponse(text)
+
+@admin_router.post("/heap/start")
+async def heap_start(frames: int = Query(25, ge=1, le=100)) -> JSONResponse:
+    """Start tracemalloc with the given traceback depth."""
+    heap_tracker.start(frames)
+    return JSONResponse({"ok": True, "tracing": heap_tracker.tracing})
+
+@admin_router.post("/heap/stop")
+async def heap_stop() -> JSONResponse:
+    """Stop tracemalloc and drop the baseline snapshot."""
+    heap_tracker.stop()
+    return JSONResponse({"ok": True, "tracing": heap_tracker.tracing})
+
+@admin_router.post("/heap/snapshot")
+async def heap_snapshot(
+    limit: int = Query(20, ge=1),
+    group_by: str = Query("traceback", pattern="^(traceback|lineno|filename)$"),
+) -> JSONResponse:
+    """Take a tracemalloc snapshot, keep it as the diff baseline and return top allocators."""
+    if not heap_tracker.tracing:
+        return JSONResponse({"ok": False, "error": "tracemalloc_not_started"}, status_code=409)
+    report = await asyncio.to_thread(heap_tracker.snapshot, limit, group_by)
+    return JSONResponse({"ok": True, **report})
+
+@admin_router.get("/heap/diff")
+async def heap_diff(
+    limit: int = Query(20, ge=1),
+    group_by: str = Query("traceback", pattern="^(traceback|lineno|filename)$"),
+) -> JSONResponse:
+    """Diff a fresh snapshot against the baseline, largest growth first."""
+    if not heap_tracker.tracing:
+        return JSONResponse({"ok": False, "error": "tracemalloc_not_started"}, status_code=409)
+    try:
+        report = await asyncio.to_thread(heap_tracker.diff, limit, group_by)
+    except RuntimeError:
+        return JSONResponse({"ok": False, "error": "no_baseline"}, status_code=409)
+    return JSONResponse({"ok": True, **report})
+
+@admin_router.get("/loop-lag")
+async def loop_lag_status() -> JSONResponse:
+    """Report the event loop lag monitor state."""
+    return JSONResponse({"ok": True, **loop_lag_monitor.status()})
+
+@admin_router.post("/loop-lag/start")
+async def loop_lag_start(threshold_ms: float | None = Query(None, gt=0)) -> JSONResponse:
+    """Start the loop lag monitor, optionally changing its slow-callback threshold."""
+    if threshold_ms is not None:
+        loop_lag_monitor.threshold_s = threshold_ms / 1000
+    loop_lag_monitor.start()
+    return JSONResponse({"ok": True, **loop_lag_monitor.status()})
+
+@admin_router.post("/loop-lag/stop")
+async def loop_lag_stop() -> JSONResponse:
+    """Stop the loop lag monitor."""
+    await loop_lag_monitor.stop()
+    return JSONResponse({"ok": True, **loop_lag_monitor.status()})
+
+api_router.include_router(admin_router)
 app.include_router(api_router)
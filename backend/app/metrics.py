@@ -7,6 +7,7 @@ from dataclasses import dataclass
 class Counters:
     uploads_total: int = 0
     upload_bytes_sum: int = 0
+    links_total: int = 0
 
 @dataclass
 class Gauges:
@@ -33,6 +34,11 @@ class Metrics:
             self.counters.uploads_total += 1
             self.counters.upload_bytes_sum += bytes_
 
+    async def inc_links(self)->None:
+        """Increment links_total (files created from already-stored content)."""
+        async with self._lock:
+            self.counters.links_total += 1
+
     async def inc_in_progress(self)->None:
         """Increment number of in-progress requests."""
         async with self._lock:
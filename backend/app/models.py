@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -11,6 +11,7 @@ class FileMeta(BaseModel):
     size: int = Field(ge=0, examples=[12345])
     content_type: str = Field(examples=["application/pdf"])
     uploaded_at: float = Field(description="epoch seconds", examples=[1734712345.12])
+    sha256: Optional[str] = Field(default=None, description="hex SHA-256 of the contents")
 
 class UploadResponse(BaseModel):
     """
@@ -25,3 +26,27 @@ class FileListResponse(BaseModel):
     """
     ok: bool = True
     files: List[FileMeta] = []
+
+SHA256_PATTERN = r"^[0-9a-f]{64}$"
+
+class DigestProbeRequest(BaseModel):
+    """
+    Request schema for asking which content digests the server already stores.
+    """
+    digests: List[str] = Field(max_length=1000, examples=[["e3b0c44298fc1c149afbf4c8996fb924"
+                                                           "27ae41e4649b934ca495991b7852b855"]])
+
+class DigestProbeResponse(BaseModel):
+    """
+    Response schema listing the probed digests that are already stored.
+    """
+    ok: bool = True
+    present: List[str] = []
+
+class LinkRequest(BaseModel):
+    """
+    Request schema for creating a file from already-stored content without a body transfer.
+    """
+    name: str = Field(examples=["report.pdf"])
+    sha256: str = Field(pattern=SHA256_PATTERN)
+    content_type: Optional[str] = Field(default=None, examples=["application/pdf"])
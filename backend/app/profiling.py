@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from collections import Counter
+from types import FrameType
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("app.profiling")
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse_frame(frame: Optional[FrameType]) -> str:
+    """Render a frame chain root-first, joined by ';' as collapsed-stack tools expect."""
+    labels: List[str] = []
+    while frame is not None:
+        labels.append(_frame_label(frame).replace(";", ":"))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def sample_stacks(thread_id: int, seconds: float, interval_s: float = 0.005) -> Counter[str]:
+    """
+    Sample the stack of one thread at a fixed interval. Blocking; run it off that thread.
+    :param thread_id: Thread to sample, typically the event loop thread.
+    :param seconds: Sampling duration.
+    :param interval_s: Delay between samples.
+    :return: Counter of collapsed stacks to sample counts.
+    """
+    counts: Counter[str] = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            counts[_collapse_frame(frame)] += 1
+        del frame
+        time.sleep(interval_s)
+    return counts
+
+
+def format_collapsed(counts: Counter[str]) -> str:
+    """
+    Format sample counts as collapsed stacks ("a;b;c 42" per line) for flamegraph tools.
+    """
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+
+class CpuProfiler:
+    """
+    Sampling profiler for the event loop thread. One profile may run at a time.
+    """
+    def __init__(self) -> None:
+        self._lock = asyncio.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    async def profile(self, seconds: float, interval_s: float = 0.005) -> str:
+        """
+        Sample the calling event loop's thread from a worker thread for ``seconds``.
+        :return: Collapsed-stack text.
+        """
+        loop_thread = threading.get_ident()
+        async with self._lock:
+            counts = await asyncio.to_thread(sample_stacks, loop_thread, seconds, interval_s)
+        return format_collapsed(counts)
+
+
+class HeapTracker:
+    """
+    tracemalloc wrapper holding a baseline snapshot to diff later snapshots against.
+    """
+    def __init__(self) -> None:
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 25) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._baseline = None
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self._baseline = None
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def snapshot(self, limit: int = 20, group_by: str = "traceback") -> Dict[str, Any]:
+        """
+        Take a snapshot, keep it as the diff baseline and report the top allocation sites.
+        :param limit: Number of entries returned.
+        :param group_by: "traceback", "lineno" or "filename".
+        """
+        snap = self._snapshot()
+        self._baseline = snap
+        stats = snap.statistics(group_by)
+        return {
+            "total_bytes": sum(s.size for s in stats),
+            "top": [
+                {"size": s.size, "count": s.count, "traceback": s.traceback.format()}
+                for s in stats[:limit]
+            ],
+        }
+
+    def diff(self, limit: int = 20, group_by: str = "traceback") -> Dict[str, Any]:
+        """
+        Compare a fresh snapshot against the baseline, largest growth first.
+        :raises RuntimeError: If no baseline snapshot has been taken.
+        """
+        if self._baseline is None:
+            raise RuntimeError("no baseline snapshot")
+        stats = self._snapshot().compare_to(self._baseline, group_by)
+        return {
+            "size_diff": sum(s.size_diff for s in stats),
+            "top": [
+                {"size_diff": s.size_diff, "size": s.size, "count_diff": s.count_diff,
+                 "traceback": s.traceback.format()}
+                for s in stats[:limit]
+            ],
+        }
+
+
+class LoopLagMonitor:
+    """
+    Event-loop lag watchdog.
+
+    A task on the loop refreshes a heartbeat every ``interval_s``; a watchdog thread logs
+    a warning with the loop thread's current stack whenever the heartbeat is older than
+    ``threshold_s``, which points at the callback blocking the loop.
+    """
+    def __init__(self, threshold_s: float = 0.1, interval_s: float = 0.02) -> None:
+        self.threshold_s = threshold_s
+        self.interval_s = interval_s
+        self.max_lag_s = 0.0
+        self.slow_count = 0
+        self._heartbeat = time.monotonic()
+        self._task: Optional[asyncio.Task[None]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop_thread = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start monitoring the running event loop."""
+        if self.running:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._stop.set()
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    async def _beat(self) -> None:
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval_s)
+            now = time.monotonic()
+            lag = now - before - self.interval_s
+            self.max_lag_s = max(self.max_lag_s, lag)
+            self._heartbeat = now
+
+    def _watch(self) -> None:
+        reported = False
+        while not self._stop.wait(self.interval_s):
+            stalled = time.monotonic() - self._heartbeat
+            if stalled < self.threshold_s:
+                reported = False
+                continue
+            if reported:
+                continue
+            reported = True
+            self.slow_count += 1
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            del frame
+            logger.warning("event loop blocked for %dms at:\n%s", int(stalled * 1000), stack)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "threshold_ms": self.threshold_s * 1000,
+            "max_lag_ms": round(self.max_lag_s * 1000, 3),
+            "slow_count": self.slow_count,
+        }
@@ -0,0 +1,550 @@
+import asyncio
+import contextlib
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import time
+import uuid
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from .storage import FileInfo, IFileStore, StoredFile
+
+logger = logging.getLogger("app.segments")
+
+# segment file header: magic, format version; bump the version on any record layout change
+_SEG_HEADER = struct.Struct("<4sH")
+_SEG_MAGIC = b"FUSG"
+_SEG_VERSION = 1
+# record header: crc32(body), kind, name_len, content_type_len, payload_len, uploaded_at,
+# sha256 of the file contents (zeroed for tombstones)
+_HEADER = struct.Struct("<IBHHId32s")
+_NO_DIGEST = bytes(32)
+_KIND_PUT = 1
+_KIND_PUT_LARGE = 2
+_KIND_DEL = 3
+# large-blob reference payload: blob size followed by the blob file name
+_LARGE_REF = struct.Struct("<Q")
+
+
+class SegmentCorruptError(RuntimeError):
+    """
+    Raised on startup when a sealed segment holds an unreadable record.
+    """
+
+
+class SegmentFormatError(SegmentCorruptError):
+    """
+    Raised on startup when a segment file has an unknown magic number or format version.
+    """
+
+
+@dataclass
+class _Entry:
+    """
+    Index entry locating the live record of a file.
+    """
+    segment: int
+    offset: int
+    record_len: int
+    data_offset: int
+    size: int
+    content_type: str
+    uploaded_at: float
+    sha256: str
+    blob: Optional[str] = None
+
+
+@dataclass
+class _SegmentStats:
+    """
+    Byte accounting for a single segment, used to pick compaction candidates.
+    """
+    total: int = 0
+    dead: int = 0
+
+
+@dataclass
+class _Record:
+    """
+    A decoded segment record.
+    """
+    kind: int
+    offset: int
+    length: int
+    name: str
+    content_type: str
+    uploaded_at: float
+    digest: bytes
+    payload_offset: int
+    payload_len: int
+
+
+def _encode(kind: int, name: str, content_type: str, payload: bytes, uploaded_at: float,
+            digest: bytes = _NO_DIGEST) -> bytes:
+    """
+    Encode a record as header + name + content type + payload.
+    """
+    n = name.encode("utf-8")
+    c = content_type.encode("utf-8")
+    body = n + c + payload
+    header = _HEADER.pack(0, kind, len(n), len(c), len(payload), uploaded_at, digest)
+    crc = zlib.crc32(header[4:] + body)
+    return _HEADER.pack(crc, kind, len(n), len(c), len(payload), uploaded_at, digest) + body
+
+
+def _iter_records(buf: bytes | mmap.mmap) -> Tuple[List[_Record], int]:
+    """
+    Decode records from a segment buffer.
+    :param buf: Whole segment contents, starting with the segment file header.
+    :return: Decoded records and the offset just past the last valid record.
+    """
+    records: List[_Record] = []
+    pos = _SEG_HEADER.size
+    end = len(buf)
+    while pos + _HEADER.size <= end:
+        crc, kind, nlen, clen, plen, ts, digest = _HEADER.unpack_from(buf, pos)
+        length = _HEADER.size + nlen + clen + plen
+        if kind not in (_KIND_PUT, _KIND_PUT_LARGE, _KIND_DEL) or pos + length > end:
+            break
+        if zlib.crc32(buf[pos + 4:pos + length]) != crc:
+            break
+        start = pos + _HEADER.size
+        records.append(_Record(
+            kind=kind, offset=pos, length=length,
+            name=bytes(buf[start:start + nlen]).decode("utf-8"),
+            content_type=bytes(buf[start + nlen:start + nlen + clen]).decode("utf-8"),
+            uploaded_at=ts,
+            digest=digest,
+            payload_offset=start + nlen + clen,
+            payload_len=plen,
+        ))
+        pos += length
+    return records, pos
+
+
+class SegmentStore(IFileStore):
+    """
+    Log-structured file store packing small blobs into append-only segment files.
+
+    Blobs up to ``inline_max_bytes`` are appended to the active segment; larger ones are
+    written to their own file under ``blobs/`` and only a reference is logged. An in-memory
+    index maps names to record offsets and is rebuilt by replaying segments on startup.
+    Deletes and overwrites append tombstones / newer records; ``compact`` rewrites live
+    records out of sealed segments whose garbage ratio exceeds ``compact_ratio``.
+    """
+    def __init__(
+        self,
+        root: str | Path,
+        segment_max_bytes: int = 64 * 1024 * 1024,
+        inline_max_bytes: int = 256 * 1024,
+        compact_ratio: float = 0.5,
+        compact_interval_s: float = 30.0,
+    ) -> None:
+        self._lock = asyncio.Lock()
+        self._root = Path(root)
+        self._seg_dir = self._root / "segments"
+        self._blob_dir = self._root / "blobs"
+        self._segment_max_bytes = segment_max_bytes
+        self._inline_max_bytes = inline_max_bytes
+        self._compact_ratio = compact_ratio
+        self._compact_interval_s = compact_interval_s
+        self._index: Dict[str, _Entry] = {}
+        self._by_digest: Dict[str, Set[str]] = {}
+        self._blob_refs: Dict[str, int] = {}
+        self._version = 0
+        self._stats: Dict[int, _SegmentStats] = {}
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._active_id = 0
+        self._active_fd = -1
+        self._active_size = 0
+        self._compactor: Optional[asyncio.Task[None]] = None
+        self._open()
+
+    # ---- filesystem helpers (blocking; called via asyncio.to_thread) ----
+
+    def _seg_path(self, seg: int) -> Path:
+        return self._seg_dir / f"{seg:08d}.seg"
+
+    def _open(self) -> None:
+        """Create directories and rebuild the index by replaying every segment in order."""
+        self._seg_dir.mkdir(parents=True, exist_ok=True)
+        self._blob_dir.mkdir(parents=True, exist_ok=True)
+        segs = sorted(int(p.stem) for p in self._seg_dir.glob("*.seg"))
+        for seg in segs:
+            path = self._seg_path(seg)
+            data = path.read_bytes()
+            if len(data) < _SEG_HEADER.size and seg == segs[-1]:
+                # crashed while creating the segment; _activate rewrites the header
+                os.truncate(path, 0)
+                self._stats[seg] = _SegmentStats()
+                continue
+            if len(data) < _SEG_HEADER.size:
+                raise SegmentFormatError(f"segment {path} is shorter than its header")
+            magic, version = _SEG_HEADER.unpack_from(data)
+            if magic != _SEG_MAGIC or version != _SEG_VERSION:
+                raise SegmentFormatError(
+                    f"unsupported segment format in {path} (magic={magic!r}, version={version})"
+                )
+            records, valid = _iter_records(data)
+            if valid < len(data):
+                # only the last segment can have been cut short by a crash mid-append;
+                # anywhere else the valid records after the bad one must not be dropped
+                if seg != segs[-1]:
+                    raise SegmentCorruptError(f"corrupt record in {path} at offset {valid}")
+                logger.warning("truncating torn segment tail", extra={"segment": seg})
+                os.truncate(path, valid)
+            self._stats[seg] = _SegmentStats(total=valid)
+            for rec in records:
+                self._apply(seg, rec, data)
+        self._sweep_blobs()
+        if segs and self._stats[segs[-1]].total < self._segment_max_bytes:
+            self._activate(segs[-1])
+        else:
+            self._activate(segs[-1] + 1 if segs else 0)
+
+    def _sweep_blobs(self) -> None:
+        """Remove blob files no replayed record references (crash between blob and record)."""
+        for path in self._blob_dir.glob("*.blob"):
+            if path.name not in self._blob_refs:
+                logger.warning("removing orphaned blob", extra={"blob": path.name})
+                self._unlink_blob(path.name)
+
+    def _apply(self, seg: int, rec: _Record, buf: bytes) -> None:
+        """Apply a replayed record to the index and byte accounting."""
+        self._mark_dead(rec.name)
+        if rec.kind == _KIND_DEL:
+            self._stats[seg].dead += rec.length
+            return
+        blob: Optional[str] = None
+        size = rec.payload_len
+        if rec.kind == _KIND_PUT_LARGE:
+            ref = bytes(buf[rec.payload_offset:rec.payload_offset + rec.payload_len])
+            (size,) = _LARGE_REF.unpack_from(ref)
+            blob = ref[_LARGE_REF.size:].decode()
+        self._insert(rec.name, _Entry(
+            segment=seg, offset=rec.offset, record_len=rec.length,
+            data_offset=rec.payload_offset, size=size,
+            content_type=rec.content_type, uploaded_at=rec.uploaded_at,
+            sha256=rec.digest.hex(), blob=blob,
+        ))
+
+    def _insert(self, name: str, entry: _Entry) -> None:
+        self._index[name] = entry
+        self._by_digest.setdefault(entry.sha256, set()).add(name)
+        if entry.blob is not None:
+            self._blob_refs[entry.blob] = self._blob_refs.get(entry.blob, 0) + 1
+
+    def _mark_dead(self, name: str) -> Optional[_Entry]:
+        """Drop ``name`` from the index, charging its record to its segment's garbage."""
+        old = self._index.pop(name, None)
+        if old is not None:
+            self._stats[old.segment].dead += old.record_len
+            names = self._by_digest.get(old.sha256)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self._by_digest[old.sha256]
+            if old.blob is not None:
+                self._blob_refs[old.blob] -= 1
+                if not self._blob_refs[old.blob]:
+                    del self._blob_refs[old.blob]
+        return old
+
+    def _release_blob(self, old: Optional[_Entry]) -> None:
+        """Remove a dead entry's blob file once no live entry references it."""
+        if old is not None and old.blob is not None and old.blob not in self._blob_refs:
+            self._unlink_blob(old.blob)
+
+    def _activate(self, seg: int) -> None:
+        """Make ``seg`` the segment receiving appends, sealing the previous one."""
+        if self._active_fd >= 0:
+            os.close(self._active_fd)
+        self._active_id = seg
+        self._active_fd = os.open(self._seg_path(seg), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._active_size = os.fstat(self._active_fd).st_size
+        if self._active_size == 0:
+            self._active_size = os.write(self._active_fd, _SEG_HEADER.pack(_SEG_MAGIC, _SEG_VERSION))
+        self._stats.setdefault(seg, _SegmentStats()).total = self._active_size
+
+    def _append(self, record: bytes) -> Tuple[int, int]:
+        """
+        Append an encoded record to the active segment, rotating when it is full.
+        :return: (segment id, record offset).
+        """
+        if (self._active_size > _SEG_HEADER.size
+                and self._active_size + len(record) > self._segment_max_bytes):
+            self._activate(self._active_id + 1)
+        seg, offset = self._active_id, self._active_size
+        os.write(self._active_fd, record)
+        self._active_size += len(record)
+        self._stats[seg].total += len(record)
+        return seg, offset
+
+    def _put(self, name: str, content_type: str, data: bytes, uploaded_at: float) -> str:
+        """
+        Write a file record (inline or large) and point the index at it.
+        :return: Hex SHA-256 of ``data``.
+        """
+        digest = hashlib.sha256(data).digest()
+        blob: Optional[str] = None
+        payload = data
+        kind = _KIND_PUT
+        if len(data) > self._inline_max_bytes:
+            blob = f"{uuid.uuid4().hex}.blob"
+            (self._blob_dir / blob).write_bytes(data)
+            payload = _LARGE_REF.pack(len(data)) + blob.encode()
+            kind = _KIND_PUT_LARGE
+        record = _encode(kind, name, content_type, payload, uploaded_at, digest)
+        try:
+            seg, offset = self._append(record)
+        except BaseException:
+            if blob is not None:
+                self._unlink_blob(blob)
+            raise
+        old = self._mark_dead(name)
+        self._insert(name, _Entry(
+            segment=seg, offset=offset, record_len=len(record),
+            data_offset=offset + len(record) - len(payload), size=len(data),
+            content_type=content_type, uploaded_at=uploaded_at, sha256=digest.hex(), blob=blob,
+        ))
+        self._release_blob(old)
+        self._version += 1
+        return digest.hex()
+
+    def _link(self, name: str, sha256: str, content_type: Optional[str],
+              uploaded_at: float) -> Optional[FileInfo]:
+        """
+        Record ``name`` as another file with existing content. Large blobs are shared by
+        reference; inline payloads are copied within the log. Nothing is re-hashed.
+        :return: FileInfo of the new file, or None if no live file has ``sha256``.
+        """
+        names = self._by_digest.get(sha256)
+        if not names:
+            return None
+        src = self._index[min(names)]
+        content_type = content_type or src.content_type
+        if src.blob is not None:
+            kind, payload = _KIND_PUT_LARGE, _LARGE_REF.pack(src.size) + src.blob.encode()
+        else:
+            kind, payload = _KIND_PUT, self._read(src)
+        record = _encode(kind, name, content_type, payload, uploaded_at, bytes.fromhex(sha256))
+        seg, offset = self._append(record)
+        old = self._mark_dead(name)
+        self._insert(name, _Entry(
+            segment=seg, offset=offset, record_len=len(record),
+            data_offset=offset + len(record) - len(payload), size=src.size,
+            content_type=content_type, uploaded_at=uploaded_at, sha256=sha256, blob=src.blob,
+        ))
+        self._release_blob(old)
+        self._version += 1
+        return FileInfo(name=name, size=src.size, content_type=content_type,
+                        uploaded_at=uploaded_at, sha256=sha256)
+
+    def _delete(self, name: str) -> bool:
+        """Append a tombstone for ``name`` and release its storage."""
+        if name not in self._index:
+            return False
+        record = _encode(_KIND_DEL, name, "", b"", time.time())
+        seg, _ = self._append(record)
+        self._stats[seg].dead += len(record)
+        self._release_blob(self._mark_dead(name))
+        self._version += 1
+        return True
+
+    def _unlink_blob(self, blob: str) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            (self._blob_dir / blob).unlink()
+
+    def _map(self, seg: int) -> mmap.mmap:
+        """Return a cached read-only mapping of a sealed segment."""
+        mm = self._maps.get(seg)
+        if mm is None:
+            with open(self._seg_path(seg), "rb") as fh:
+                mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[seg] = mm
+        return mm
+
+    def _read(self, entry: _Entry) -> bytes:
+        """Read the contents referenced by an index entry."""
+        if entry.blob is not None:
+            return (self._blob_dir / entry.blob).read_bytes()
+        if entry.size == 0:
+            return b""
+        if entry.segment == self._active_id:
+            # the active segment keeps growing, so read it directly instead of mapping it
+            fd = os.open(self._seg_path(entry.segment), os.O_RDONLY)
+            try:
+                return os.pread(fd, entry.size, entry.data_offset)
+            finally:
+                os.close(fd)
+        mm = self._map(entry.segment)
+        return mm[entry.data_offset:entry.data_offset + entry.size]
+
+    def _to_stored(self, name: str, entry: _Entry) -> StoredFile:
+        return StoredFile(name=name, size=entry.size, content_type=entry.content_type,
+                          uploaded_at=entry.uploaded_at, data=self._read(entry),
+                          sha256=entry.sha256)
+
+    def _candidates(self) -> List[int]:
+        """Sealed segments whose garbage ratio crosses the compaction threshold, oldest first."""
+        return sorted(
+            seg for seg, st in self._stats.items()
+            if seg != self._active_id and st.total and st.dead / st.total >= self._compact_ratio
+        )
+
+    def _compact_segment(self, seg: int) -> int:
+        """
+        Rewrite live records of a sealed segment into the active one and remove it.
+        Tombstones are carried forward unless no older segment remains to resurrect from.
+        :return: Bytes reclaimed.
+        """
+        mm = self._map(seg)
+        records, _ = _iter_records(mm)
+        oldest = seg == min(self._stats)
+        for rec in records:
+            if rec.kind == _KIND_DEL:
+                if not oldest and rec.name not in self._index:
+                    record = _encode(_KIND_DEL, rec.name, "", b"", rec.uploaded_at)
+                    new_seg, _ = self._append(record)
+                    self._stats[new_seg].dead += len(record)
+                continue
+            entry = self._index.get(rec.name)
+            if entry is None or entry.segment != seg or entry.offset != rec.offset:
+                continue
+            payload = mm[rec.payload_offset:rec.payload_offset + rec.payload_len]
+            record = _encode(rec.kind, rec.name, rec.content_type, payload, rec.uploaded_at,
+                             rec.digest)
+            new_seg, offset = self._append(record)
+            entry.segment, entry.offset, entry.record_len = new_seg, offset, len(record)
+            entry.data_offset = offset + len(record) - len(payload)
+        reclaimed = self._stats.pop(seg).total
+        self._maps.pop(seg).close()
+        self._seg_path(seg).unlink()
+        return reclaimed
+
+    def _close(self) -> None:
+        for mm in self._maps.values():
+            mm.close()
+        self._maps.clear()
+        if self._active_fd >= 0:
+            os.close(self._active_fd)
+            self._active_fd = -1
+
+    def _reset(self) -> None:
+        """Remove every segment and blob and start over with an empty log."""
+        self._close()
+        for p in self._seg_dir.glob("*.seg"):
+            p.unlink()
+        for p in self._blob_dir.glob("*.blob"):
+            p.unlink()
+        self._index.clear()
+        self._by_digest.clear()
+        self._blob_refs.clear()
+        self._stats.clear()
+        self._version += 1
+        self._activate(0)
+
+    # ---- IFileStore ----
+
+    @property
+    def version(self) -> int:
+        # compaction moves records without changing contents, so it does not bump this
+        return self._version
+
+    async def save(self, name: str, content_type: str, data: bytes) -> StoredFile:
+        uploaded_at = time.time()
+        async with self._lock:
+            sha256 = await asyncio.to_thread(self._put, name, content_type, data, uploaded_at)
+        return StoredFile(name=name, size=len(data), content_type=content_type,
+                          uploaded_at=uploaded_at, data=data, sha256=sha256)
+
+    async def list(self) -> List[StoredFile]:
+        async with self._lock:
+            entries = sorted(self._index.items(), key=lambda kv: kv[1].uploaded_at, reverse=True)
+            return await asyncio.to_thread(lambda: [self._to_stored(n, e) for n, e in entries])
+
+    async def list_info(self) -> List[FileInfo]:
+        # served from the in-memory index; no segment or blob reads
+        async with self._lock:
+            entries = sorted(self._index.items(), key=lambda kv: kv[1].uploaded_at, reverse=True)
+            return [FileInfo(name=n, size=e.size, content_type=e.content_type,
+                             uploaded_at=e.uploaded_at, sha256=e.sha256) for n, e in entries]
+
+    async def get(self, name: str) -> Optional[StoredFile]:
+        async with self._lock:
+            entry = self._index.get(name)
+            if entry is None:
+                return None
+            return await asyncio.to_thread(self._to_stored, name, entry)
+
+    async def exists(self, name: str) -> bool:
+        # index lookup only; never touches segment or blob files
+        async with self._lock:
+            return name in self._index
+
+    async def delete(self, name: str) -> bool:
+        async with self._lock:
+            return await asyncio.to_thread(self._delete, name)
+
+    async def has_digests(self, digests: List[str]) -> List[str]:
+        async with self._lock:
+            return [d for d in digests if d in self._by_digest]
+
+    async def link(self, name: str, sha256: str,
+                   content_type: Optional[str] = None) -> Optional[FileInfo]:
+        uploaded_at = time.time()
+        async with self._lock:
+            return await asyncio.to_thread(self._link, name, sha256, content_type, uploaded_at)
+
+    async def clear(self) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._reset)
+
+    # ---- compaction ----
+
+    async def compact(self) -> int:
+        """
+        Compact the sealed segments above the garbage threshold at the start of the pass.
+        Segments sealed by the pass itself wait for the next one, so forwarded tombstones
+        cannot keep it going. The lock is released between segments so uploads are not
+        stalled for a full pass.
+        :return: Total bytes reclaimed.
+        """
+        reclaimed = 0
+        async with self._lock:
+            candidates = self._candidates()
+        for seg in candidates:
+            async with self._lock:
+                if seg in self._stats and seg != self._active_id:
+                    reclaimed += await asyncio.to_thread(self._compact_segment, seg)
+        return reclaimed
+
+    async def _compact_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._compact_interval_s)
+            try:
+                reclaimed = await self.compact()
+                if reclaimed:
+                    logger.info("segments compacted", extra={"reclaimed_bytes": reclaimed})
+            except Exception:
+                logger.exception("segment compaction failed")
+
+    def start_compactor(self) -> None:
+        """Start the background compaction task on the running event loop."""
+        if self._compactor is None or self._compactor.done():
+            self._compactor = asyncio.create_task(self._compact_loop())
+
+    async def aclose(self) -> None:
+        """Stop the compactor and release file handles and mappings."""
+        if self._compactor is not None:
+            self._compactor.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._compactor
+            self._compactor = None
+        async with self._lock:
+            self._close()
@@ -1,7 +1,8 @@
 import asyncio
+import hashlib
 import time
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Protocol
+from typing import Dict, List, Optional, Protocol, Set
 
 
 @dataclass
@@ -14,6 +15,18 @@ class StoredFile:
     content_type: str
     uploaded_at: float
     data: bytes
+    sha256: str = ""
+
+@dataclass
+class FileInfo:
+    """
+    Metadata of a stored file, without its contents.
+    """
+    name: str
+    size: int
+    content_type: str
+    uploaded_at: float
+    sha256: str = ""
 
 class IFileStore(Protocol):
     """
@@ -21,8 +34,18 @@ class IFileStore(Protocol):
     """
     async def save(self, name: str, content_type: str, data: bytes) -> StoredFile: ...
     async def list(self) -> List[StoredFile]: ...
+    async def list_info(self) -> List[FileInfo]: ...
     async def clear(self) -> None: ...
     async def get(self, name: str) -> Optional[StoredFile]: ...
+    async def exists(self, name: str) -> bool: ...
+    async def delete(self, name: str) -> bool: ...
+    async def has_digests(self, digests: List[str]) -> List[str]: ...
+    async def link(self, name: str, sha256: str,
+                   content_type: Optional[str] = None) -> Optional[FileInfo]: ...
+    @property
+    def version(self) -> int:
+        """Monotonic counter bumped on every mutation; equal versions mean equal contents."""
+        ...
 
 class MemoryStore(IFileStore):
     """
@@ -31,41 +54,123 @@ class MemoryStore(IFileStore):
     def __init__(self) -> None:
         self._lock = asyncio.Lock()
         self._files: Dict[str, StoredFile] = {}
+        self._by_digest: Dict[str, Set[str]] = {}
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def _unindex(self, sf: Optional[StoredFile]) -> None:
+        if sf is None:
+            return
+        names = self._by_digest.get(sf.sha256)
+        if names is not None:
+            names.discard(sf.name)
+            if not names:
+                del self._by_digest[sf.sha256]
 
     async def save(self, name: str, content_type: str, data: bytes) -> StoredFile:
         sf = StoredFile(name=name, content_type=content_type, data=data,
-                        size=len(data), uploaded_at=time.time())
+                        size=len(data), uploaded_at=time.time(),
+                        sha256=hashlib.sha256(data).hexdigest())
         async with self._lock:
+            self._unindex(self._files.get(name))
             self._files[name] = sf
+            self._by_digest.setdefault(sf.sha256, set()).add(name)
+            self._version += 1
         return sf
 
     async def list(self) -> List[StoredFile]:
         async with self._lock:
             return sorted(self._files.values(), key=lambda f: f.uploaded_at, reverse=True)
 
+    async def list_info(self) -> List[FileInfo]:
+        return [FileInfo(name=f.name, size=f.size, content_type=f.content_type,
+                         uploaded_at=f.uploaded_at, sha256=f.sha256)
+                for f in await self.list()]
+
     async def clear(self) -> None:
         async with self._lock:
             self._files.clear()
+            self._by_digest.clear()
+            self._version += 1
 
     async def get(self, name: str) -> Optional[StoredFile]:
         async with self._lock:
             return self._files.get(name)
 
+    async def exists(self, name: str) -> bool:
+        async with self._lock:
+            return name in self._files
+
+    async def delete(self, name: str) -> bool:
+        async with self._lock:
+            sf = self._files.pop(name, None)
+            if sf is None:
+                return False
+            self._unindex(sf)
+            self._version += 1
+            return True
+
+    async def has_digests(self, digests: List[str]) -> List[str]:
+        async with self._lock:
+            return [d for d in digests if d in self._by_digest]
+
+    async def link(self, name: str, sha256: str,
+                   content_type: Optional[str] = None) -> Optional[FileInfo]:
+        async with self._lock:
+            names = self._by_digest.get(sha256)
+            if not names:
+                return None
+            src = self._files[min(names)]
+            # share the existing bytes object; nothing is copied or re-hashed
+            sf = StoredFile(name=name, content_type=content_type or src.content_type,
+                            data=src.data, size=src.size, uploaded_at=time.time(),
+                            sha256=src.sha256)
+            self._unindex(self._files.get(name))
+            self._files[name] = sf
+            self._by_digest.setdefault(sha256, set()).add(name)
+            self._version += 1
+            return FileInfo(name=sf.name, size=sf.size, content_type=sf.content_type,
+                            uploaded_at=sf.uploaded_at, sha256=sf.sha256)
+
 class S3StubStore(IFileStore):
     """
     Stubbed file store mimicking S3 behavior using an inner MemoryStore.
     """
     def __init__(self)-> None: self._inner = MemoryStore()
+    @property
+    def version(self)->int: return self._inner.version
     async def save(self, name: str, content_type: str, data: bytes)->StoredFile:
         return await self._inner.save(name, content_type, data)
     async def list(self)->list[StoredFile]: return await self._inner.list()
+    async def list_info(self)->List[FileInfo]: return await self._inner.list_info()
     async def get(self, name: str)->StoredFile|None: return await self._inner.get(name)
+    async def exists(self, name: str)->bool: return await self._inner.exists(name)
     async def clear(self)-> None: return await self._inner.clear()
+    async def delete(self, name: str)->bool: return await self._inner.delete(name)
+    async def has_digests(self, digests: List[str])->List[str]:
+        return await self._inner.has_digests(digests)
+    async def link(self, name: str, sha256: str,
+                   content_type: Optional[str] = None)->FileInfo|None:
+        return await self._inner.link(name, sha256, content_type)
 
 def make_store(kind: str) -> IFileStore:
     """
     Factory function for creating a file store backend.
-    :param kind: "memory" for MemoryStore, anything else for S3StubStore.
+    :param kind: "memory" for MemoryStore, "segment" for SegmentStore,
+        anything else for S3StubStore.
     :return: IFileStore implementation.
     """
+    if kind == "segment":
+        from .config import settings
+        from .segments import SegmentStore
+        return SegmentStore(
+            settings.SEGMENT_DIR,
+            segment_max_bytes=settings.SEGMENT_MAX_BYTES,
+            inline_max_bytes=settings.SEGMENT_INLINE_MAX_BYTES,
+            compact_ratio=settings.SEGMENT_COMPACT_RATIO,
+            compact_interval_s=settings.SEGMENT_COMPACT_INTERVAL_SEC,
+        )
     return MemoryStore() if kind == "memory" else S3StubStore()
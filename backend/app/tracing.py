@@ -0,0 +1,232 @@
+import json
+import logging
+import queue
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Protocol
+
+logger = logging.getLogger("app.tracing")
+_TRACEPARENT_RE = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    """
+    W3C trace context identifying a span: trace id, span id and trace flags.
+    """
+    trace_id: str
+    span_id: str
+    flags: str = "01"
+
+    @classmethod
+    def parse(cls, header: Optional[str]) -> Optional["SpanContext"]:
+        """
+        Parse a ``traceparent`` header.
+        :param header: Raw header value, may be None.
+        :return: SpanContext, or None if absent or malformed (including all-zero ids).
+        """
+        if not header:
+            return None
+        m = _TRACEPARENT_RE.match(header.strip().lower())
+        if m is None or m.group(1) == "ff":
+            return None
+        _, trace_id, span_id, flags = m.groups()
+        if trace_id == "0" * 32 or span_id == "0" * 16:
+            return None
+        return cls(trace_id=trace_id, span_id=span_id, flags=flags)
+
+    def traceparent(self) -> str:
+        """Format as a version 00 ``traceparent`` header."""
+        return f"00-{self.trace_id}-{self.span_id}-{self.flags}"
+
+
+@dataclass
+class Span:
+    """
+    A timed operation within a trace. ``root`` is the local root span collecting its children.
+    """
+    name: str
+    context: SpanContext
+    parent_id: Optional[str]
+    start: float
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    duration_ms: float = 0.0
+    error: Optional[str] = None
+    root: Optional["Span"] = field(default=None, repr=False)
+    children: List["Span"] = field(default_factory=list, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.context.trace_id,
+            "span_id": self.context.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class SpanExporter(Protocol):
+    """
+    Protocol for span sinks. ``export`` receives every span of a finished local trace,
+    root first.
+    """
+    def export(self, spans: List[Span]) -> None: ...
+
+
+class JsonLinesExporter(SpanExporter):
+    """
+    Append each finished span as one JSON object per line to a local file.
+    ``export`` only enqueues; a writer thread serializes and writes, so request handling
+    never blocks on file I/O. Traces are dropped (and counted) if the queue is full.
+    """
+    def __init__(self, path: str | Path, max_queue: int = 10_000) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._queue: queue.Queue[Optional[List[Span]]] = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="trace-jsonl-writer", daemon=True)
+        self._thread.start()
+
+    def export(self, spans: List[Span]) -> None:
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        with self._path.open("a", encoding="utf-8") as fh:
+            while True:
+                spans = self._queue.get()
+                try:
+                    if spans is None:
+                        return
+                    fh.write("".join(json.dumps(s.to_dict(), ensure_ascii=False) + "\n"
+                                     for s in spans))
+                    if self._queue.empty():
+                        fh.flush()
+                except Exception:
+                    logger.exception("span file write failed")
+                finally:
+                    self._queue.task_done()
+
+    def flush(self) -> None:
+        """Block until every queued trace has been written."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Write out queued traces and stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+
+class RingBufferExporter(SpanExporter):
+    """
+    Keep the most recent ``capacity`` traces in memory for querying.
+    """
+    def __init__(self, capacity: int = 256) -> None:
+        self._traces: Deque[List[Span]] = deque(maxlen=capacity)
+
+    def export(self, spans: List[Span]) -> None:
+        self._traces.append(spans)
+
+    def slowest(self, min_duration_ms: float = 0.0, limit: int = 20) -> List[List[Span]]:
+        """
+        Return buffered traces at or above ``min_duration_ms``, slowest root first.
+        :param min_duration_ms: Minimum root span duration.
+        :param limit: Maximum number of traces returned.
+        """
+        hits = [t for t in list(self._traces) if t[0].duration_ms >= min_duration_ms]
+        hits.sort(key=lambda t: t[0].duration_ms, reverse=True)
+        return hits[:limit]
+
+    def clear(self) -> None:
+        self._traces.clear()
+
+
+class Tracer:
+    """
+    Minimal in-process tracer. Spans nest through a contextvar; when a local root span
+    ends, the root and all of its children are handed to every exporter.
+    """
+    def __init__(self, exporters: Optional[List[SpanExporter]] = None) -> None:
+        self.exporters: List[SpanExporter] = list(exporters or [])
+
+    def add_exporter(self, exporter: SpanExporter) -> None:
+        self.exporters.append(exporter)
+
+    def _new_span(self, name: str, parent: Optional[SpanContext], start: float,
+                  attributes: Dict[str, Any]) -> Span:
+        active = current_span.get()
+        if parent is None and active is not None:
+            ctx = SpanContext(active.context.trace_id, secrets.token_hex(8), active.context.flags)
+            return Span(name=name, context=ctx, parent_id=active.context.span_id, start=start,
+                        attributes=attributes, root=active.root or active)
+        trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        flags = parent.flags if parent else "01"
+        ctx = SpanContext(trace_id, secrets.token_hex(8), flags)
+        return Span(name=name, context=ctx, parent_id=parent.span_id if parent else None,
+                    start=start, attributes=attributes)
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[SpanContext] = None,
+             **attributes: Any) -> Iterator[Span]:
+        """
+        Time a block as a span, nested under the current span unless ``parent`` (a remote
+        context) is given, in which case a new local root is started.
+        :param name: Span name, e.g. "upload.read_stream".
+        :param parent: Remote parent context from an incoming ``traceparent``.
+        :param attributes: Initial span attributes.
+        """
+        sp = self._new_span(name, parent, time.time(), attributes)
+        token = current_span.set(sp)
+        started = time.perf_counter()
+        try:
+            yield sp
+        except BaseException as exc:
+            sp.error = type(exc).__name__
+            raise
+        finally:
+            sp.duration_ms = (time.perf_counter() - started) * 1000
+            current_span.reset(token)
+            self._finish(sp)
+
+    def record(self, name: str, start: float, end: float, **attributes: Any) -> Optional[Span]:
+        """
+        Record an already-elapsed phase as a child of the current span.
+        :param start: Wall-clock start (epoch seconds).
+        :param end: Wall-clock end (epoch seconds).
+        :return: The recorded span, or None if there is no active span.
+        """
+        if current_span.get() is None:
+            return None
+        sp = self._new_span(name, None, start, attributes)
+        sp.duration_ms = max(end - start, 0.0) * 1000
+        self._finish(sp)
+        return sp
+
+    def _finish(self, sp: Span) -> None:
+        if sp.root is not None:
+            sp.root.children.append(sp)
+            return
+        spans = [sp, *sorted(sp.children, key=lambda c: c.start)]
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans)
+            except Exception:
+                logger.exception("span export failed")
+
+
+tracer = Tracer()
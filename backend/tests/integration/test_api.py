@@ -1,5 +1,6 @@
 import asyncio
 import contextlib
+import hashlib
 
 import httpx
 import pytest
@@ -144,4 +145,121 @@ async def test_duplicate_filename_gets_random_suffix():
         assert r1.status_code == 200 and r2.status_code == 200
         n1 = r1.json()["file"]["name"]
         n2 = r2.json()["file"]["name"]
-        assert n1 != n2 and n1.startswith("dup") and n2.startswith("dup")
\ No newline at end of file
+        assert n1 != n2 and n1.startswith("dup") and n2.startswith("dup")
+
+@pytest.mark.asyncio
+async def test_admin_traces_lists_upload_phases(monkeypatch):
+    from app.main import trace_buffer
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    trace_buffer.clear()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        r = await ac.post(f"{settings.API_PREFIX}/upload",
+                          files={"file": ("traced.txt", b"abc", "text/plain")})
+        assert r.status_code == 200
+
+        denied = await ac.get(f"{settings.API_PREFIX}/admin/traces")
+        assert denied.status_code == 403
+
+        r = await ac.get(f"{settings.API_PREFIX}/admin/traces",
+                         headers={"x-admin-token": "secret"})
+        assert r.status_code == 200
+        (upload,) = [t for t in r.json()["traces"]
+                     if t["spans"][0]["attributes"]["path"].endswith("/upload")]
+        names = {s["name"] for s in upload["spans"]}
+        assert {"upload.receive_multipart", "upload.semaphore_wait", "upload.read_stream",
+                "upload.dedupe_lock_wait", "store.save"} <= names
+
+@pytest.mark.asyncio
+async def test_admin_disabled_without_token():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        r = await ac.get(f"{settings.API_PREFIX}/admin/traces")
+        assert r.status_code == 404
+
+@pytest.mark.asyncio
+async def test_admin_profile_and_heap_endpoints(monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    headers = {"x-admin-token": "secret"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test",
+                                 headers=headers) as ac:
+        r = await ac.get(f"{settings.API_PREFIX}/admin/profile/cpu", params={"seconds": 0.05})
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/plain")
+
+        r = await ac.get(f"{settings.API_PREFIX}/admin/profile/cpu",
+                         params={"seconds": settings.PROFILE_MAX_SECONDS + 1})
+        assert r.status_code == 400
+
+        r = await ac.post(f"{settings.API_PREFIX}/admin/heap/snapshot")
+        assert r.status_code == 409
+        try:
+            assert (await ac.post(f"{settings.API_PREFIX}/admin/heap/start")).status_code == 200
+            r = await ac.post(f"{settings.API_PREFIX}/admin/heap/snapshot", params={"limit": 3})
+            assert r.status_code == 200 and len(r.json()["top"]) <= 3
+            await ac.post(f"{settings.API_PREFIX}/upload",
+                          files={"file": ("held.bin", b"x" * 4096, "application/octet-stream")})
+            r = await ac.get(f"{settings.API_PREFIX}/admin/heap/diff")
+            assert r.status_code == 200 and "size_diff" in r.json()
+        finally:
+            await ac.post(f"{settings.API_PREFIX}/admin/heap/stop")
+
+        r = await ac.post(f"{settings.API_PREFIX}/admin/loop-lag/start",
+                          params={"threshold_ms": 250})
+        assert r.json()["running"] and r.json()["threshold_ms"] == 250
+        r = await ac.post(f"{settings.API_PREFIX}/admin/loop-lag/stop")
+        assert not r.json()["running"]
+
+@pytest.mark.asyncio
+async def test_probe_and_link_existing_content():
+    data = b"same bytes"
+    digest = hashlib.sha256(data).hexdigest()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        r = await ac.post(f"{settings.API_PREFIX}/files/probe", json={"digests": [digest]})
+        assert r.status_code == 200 and r.json()["present"] == []
+        assert (await ac.head(f"{settings.API_PREFIX}/blobs/{digest}")).status_code == 404
+        r = await ac.post(f"{settings.API_PREFIX}/files/link",
+                          json={"name": "copy.txt", "sha256": digest})
+        assert r.status_code == 404
+
+        up = await ac.post(f"{settings.API_PREFIX}/upload",
+                           files={"file": ("orig.txt", data, "text/plain")})
+        assert up.json()["file"]["sha256"] == digest
+
+        r = await ac.post(f"{settings.API_PREFIX}/files/probe",
+                          json={"digests": [digest.upper(), "0" * 64]})
+        assert r.json()["present"] == [digest]
+        assert (await ac.head(f"{settings.API_PREFIX}/blobs/{digest}")).status_code == 200
+
+        r = await ac.post(f"{settings.API_PREFIX}/files/link",
+                          json={"name": "orig.txt", "sha256": digest})
+        assert r.status_code == 200
+        linked = r.json()["file"]
+        assert linked["name"] != "orig.txt" and linked["name"].startswith("orig")
+        assert linked["content_type"] == "text/plain" and linked["size"] == len(data)
+
+        dl = await ac.get(f"{settings.API_PREFIX}/files/{linked['name']}")
+        assert dl.content == data
+
+@pytest.mark.asyncio
+async def test_list_files_etag_and_not_modified():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        r1 = await ac.get(f"{settings.API_PREFIX}/files")
+        etag = r1.headers["etag"]
+        assert etag.startswith('W/"') and r1.headers["x-api-version"]
+
+        r2 = await ac.get(f"{settings.API_PREFIX}/files", headers={"if-none-match": etag})
+        assert r2.status_code == 304 and r2.content == b""
+        assert r2.headers["etag"] == etag
+
+        await ac.post(f"{settings.API_PREFIX}/upload",
+                      files={"file": ("new.txt", b"n", "text/plain")})
+        r3 = await ac.get(f"{settings.API_PREFIX}/files", headers={"if-none-match": etag})
+        assert r3.status_code == 200 and r3.headers["etag"] != etag
+        assert [f["name"] for f in r3.json()["files"]] == ["new.txt"]
+
+        r4 = await ac.get(f"{settings.API_PREFIX}/files")
+        assert r4.content == r3.content and r4.headers["etag"] == r3.headers["etag"]
@@ -52,4 +52,32 @@ async def test_in_flight_middleware_tracks_active_requests():
         assert metrics.gauges.requests_in_progress == 0
         r = await ac.get("/ok")
         assert r.status_code == 200
-        assert metrics.gauges.requests_in_progress == 0
\ No newline at end of file
+        assert metrics.gauges.requests_in_progress == 0
+
+@pytest.mark.asyncio
+async def test_request_context_middleware_continues_incoming_trace():
+    app = FastAPI()
+    app.add_middleware(RequestContextMiddleware)
+
+    @app.get("/check")
+    async def check():
+        return {"tid": trace_id_var.get()}
+
+    incoming = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        r = await ac.get("/check", headers={"traceparent": incoming})
+        _, trace_id, span_id, _ = r.headers["traceparent"].split("-")
+        assert r.json()["tid"] == trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+        assert span_id not in ("0" * 16, "00f067aa0ba902b7")
+
+
+@pytest.mark.asyncio
+async def test_cors_exposes_retry_after():
+    from app.main import app as main_app
+
+    transport = httpx.ASGITransport(app=main_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        r = await ac.get("/", headers={"origin": "http://localhost:3000"})
+        exposed = r.headers["access-control-expose-headers"].lower()
+        assert "retry-after" in exposed
@@ -0,0 +1,14 @@
+from app.cache import VersionedCache
+
+
+def test_versioned_cache_invalidates_on_new_version():
+    c = VersionedCache(max_entries=2)
+    c.put(1, "", b"a")
+    c.put(1, "q=1", b"b")
+    assert c.get(1, "") == b"a" and c.get(2, "") is None
+
+    c.put(1, "q=2", b"c")
+    assert c.get(1, "") is None and c.get(1, "q=2") == b"c"
+
+    c.put(2, "", b"d")
+    assert c.get(1, "q=1") is None and c.get(2, "") == b"d"
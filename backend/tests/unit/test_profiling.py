@@ -0,0 +1,50 @@
+import asyncio
+import logging
+import time
+
+import pytest
+
+from app.profiling import CpuProfiler, HeapTracker, LoopLagMonitor
+
+
+@pytest.mark.asyncio
+async def test_cpu_profiler_returns_collapsed_stacks():
+    p = CpuProfiler()
+    text = await p.profile(0.05, interval_s=0.005)
+    lines = text.strip().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert ";" in stack and int(count) > 0
+
+
+def test_heap_tracker_snapshot_and_diff():
+    h = HeapTracker()
+    h.start(frames=5)
+    try:
+        with pytest.raises(RuntimeError):
+            h.diff()
+        assert h.snapshot(limit=5)["total_bytes"] > 0
+        held = [bytearray(64 * 1024) for _ in range(8)]
+        report = h.diff(limit=5)
+        assert report["size_diff"] >= 8 * 64 * 1024
+        assert report["top"][0]["size_diff"] > 0
+        del held
+    finally:
+        h.stop()
+    assert not h.tracing
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor_logs_blocking_callback(caplog):
+    m = LoopLagMonitor(threshold_s=0.05, interval_s=0.01)
+    m.start()
+    try:
+        await asyncio.sleep(0.03)
+        with caplog.at_level(logging.WARNING, logger="app.profiling"):
+            time.sleep(0.2)  # block the loop
+            await asyncio.sleep(0.03)
+    finally:
+        await m.stop()
+    assert m.slow_count >= 1
+    assert m.status()["max_lag_ms"] >= 100
+    assert any("event loop blocked" in r.getMessage() for r in caplog.records)
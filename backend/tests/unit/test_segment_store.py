@@ -0,0 +1,186 @@
+import hashlib
+
+import pytest
+
+from app.segments import SegmentCorruptError, SegmentFormatError, SegmentStore
+
+
+@pytest.mark.asyncio
+async def test_segment_store_roundtrip_and_replay(tmp_path):
+    s = SegmentStore(tmp_path, inline_max_bytes=16)
+    await s.save("a.txt", "text/plain", b"hi")
+    await s.save("big.bin", "application/octet-stream", b"x" * 100)
+    assert (await s.get("a.txt")).data == b"hi"
+    assert (await s.get("big.bin")).data == b"x" * 100
+    assert len(list((tmp_path / "blobs").iterdir())) == 1
+    await s.aclose()
+
+    reopened = SegmentStore(tmp_path, inline_max_bytes=16)
+    names = [f.name for f in await reopened.list()]
+    assert names == ["big.bin", "a.txt"]
+    assert (await reopened.get("big.bin")).size == 100
+    await reopened.aclose()
+
+
+@pytest.mark.asyncio
+async def test_segment_store_delete_leaves_tombstone(tmp_path):
+    s = SegmentStore(tmp_path)
+    await s.save("a.txt", "text/plain", b"hi")
+    assert await s.delete("a.txt")
+    assert not await s.delete("a.txt")
+    assert await s.get("a.txt") is None
+    await s.aclose()
+
+    reopened = SegmentStore(tmp_path)
+    assert await reopened.get("a.txt") is None
+    await reopened.aclose()
+
+
+@pytest.mark.asyncio
+async def test_segment_store_compaction_reclaims_space(tmp_path):
+    s = SegmentStore(tmp_path, segment_max_bytes=256)
+    for i in range(20):
+        await s.save(f"f{i}.txt", "text/plain", f"data{i}".encode() * 4)
+    for i in range(15):
+        await s.delete(f"f{i}.txt")
+    before = sum(p.stat().st_size for p in (tmp_path / "segments").iterdir())
+
+    assert await s.compact() > 0
+    after = sum(p.stat().st_size for p in (tmp_path / "segments").iterdir())
+    assert after < before
+    assert [f.name for f in await s.list()] == [f"f{i}.txt" for i in range(19, 14, -1)]
+    await s.aclose()
+
+    reopened = SegmentStore(tmp_path, segment_max_bytes=256)
+    assert len(await reopened.list()) == 5
+    assert (await reopened.get("f19.txt")).data == b"data19" * 4
+    assert await reopened.get("f0.txt") is None
+    await reopened.aclose()
+
+
+@pytest.mark.asyncio
+async def test_segment_store_truncates_torn_tail(tmp_path):
+    s = SegmentStore(tmp_path)
+    await s.save("a.txt", "text/plain", b"hi")
+    await s.aclose()
+    seg = next((tmp_path / "segments").iterdir())
+    with seg.open("ab") as fh:
+        fh.write(b"\x00\x01partial")
+
+    reopened = SegmentStore(tmp_path)
+    await reopened.save("b.txt", "text/plain", b"yo")
+    assert (await reopened.get("a.txt")).data == b"hi"
+    assert (await reopened.get("b.txt")).data == b"yo"
+    await reopened.aclose()
+
+
+@pytest.mark.asyncio
+async def test_segment_store_digest_index_survives_replay(tmp_path):
+    digest = hashlib.sha256(b"hi").hexdigest()
+    s = SegmentStore(tmp_path)
+    await s.save("a.txt", "text/plain", b"hi")
+    await s.save("b.txt", "text/plain", b"hi")
+    await s.delete("a.txt")
+    await s.aclose()
+
+    reopened = SegmentStore(tmp_path)
+    assert await reopened.has_digests([digest]) == [digest]
+    assert (await reopened.get("b.txt")).sha256 == digest
+    assert not await reopened.exists("a.txt")
+    await reopened.aclose()
+
+
+@pytest.mark.asyncio
+async def test_segment_store_refuses_to_truncate_sealed_segment(tmp_path):
+    s = SegmentStore(tmp_path, segment_max_bytes=128)
+    for i in range(6):
+        await s.save(f"f{i}.txt", "text/plain", b"x" * 40)
+    await s.aclose()
+    segs = sorted((tmp_path / "segments").iterdir())
+    assert len(segs) > 1
+    raw = bytearray(segs[0].read_bytes())
+    raw[-1] ^= 0xFF
+    segs[0].write_bytes(bytes(raw))
+    size = len(raw)
+
+    with pytest.raises(SegmentCorruptError):
+        SegmentStore(tmp_path, segment_max_bytes=128)
+    assert segs[0].stat().st_size == size
+
+
+@pytest.mark.asyncio
+async def test_segment_store_metadata_reads_skip_blobs(tmp_path):
+    s = SegmentStore(tmp_path, inline_max_bytes=16)
+    await s.save("big.bin", "application/octet-stream", b"x" * 100)
+    await s.save("a.txt", "text/plain", b"hi")
+    for blob in (tmp_path / "blobs").iterdir():
+        blob.unlink()  # any data read would now fail
+
+    infos = await s.list_info()
+    assert [(f.name, f.size) for f in infos] == [("a.txt", 2), ("big.bin", 100)]
+    assert await s.exists("big.bin")
+    assert not await s.exists("missing.bin")
+    await s.aclose()
+
+
+@pytest.mark.asyncio
+async def test_segment_store_link_shares_blob(tmp_path):
+    data = b"x" * 100
+    digest = hashlib.sha256(data).hexdigest()
+    s = SegmentStore(tmp_path, inline_max_bytes=16)
+    await s.save("orig.bin", "application/octet-stream", data)
+    await s.save("small.txt", "text/plain", b"hi")
+
+    info = await s.link("copy.bin", digest)
+    assert info.name == "copy.bin" and info.size == 100 and info.sha256 == digest
+    assert await s.link("nope.bin", "0" * 64) is None
+    assert len(list((tmp_path / "blobs").iterdir())) == 1
+    small = await s.link("small-copy.txt", hashlib.sha256(b"hi").hexdigest(), "text/x")
+    assert small.content_type == "text/x"
+
+    await s.delete("orig.bin")
+    assert len(list((tmp_path / "blobs").iterdir())) == 1
+    assert (await s.get("copy.bin")).data == data
+    await s.aclose()
+
+    reopened = SegmentStore(tmp_path, inline_max_bytes=16)
+    assert (await reopened.get("copy.bin")).data == data
+    assert (await reopened.get("small-copy.txt")).data == b"hi"
+    await reopened.delete("copy.bin")
+    assert list((tmp_path / "blobs").iterdir()) == []
+    await reopened.aclose()
+
+
+@pytest.mark.asyncio
+async def test_segment_store_rejects_unknown_segment_format(tmp_path):
+    seg_dir = tmp_path / "segments"
+    seg_dir.mkdir()
+    legacy = seg_dir / "00000000.seg"
+    legacy.write_bytes(b"\x01\x02\x03\x04 records without a file header")
+
+    with pytest.raises(SegmentFormatError):
+        SegmentStore(tmp_path)
+    assert legacy.read_bytes().startswith(b"\x01\x02\x03\x04")
+
+
+@pytest.mark.asyncio
+async def test_segment_store_removes_orphaned_blobs(tmp_path, monkeypatch):
+    s = SegmentStore(tmp_path, inline_max_bytes=16)
+    await s.save("big.bin", "application/octet-stream", b"x" * 100)
+
+    def fail(record):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(s, "_append", fail)
+    with pytest.raises(OSError):
+        await s.save("other.bin", "application/octet-stream", b"y" * 100)
+    assert len(list((tmp_path / "blobs").iterdir())) == 1
+    monkeypatch.undo()
+    await s.aclose()
+
+    # blob written before a crash, with no record pointing at it
+    (tmp_path / "blobs" / "stray.blob").write_bytes(b"z" * 100)
+    reopened = SegmentStore(tmp_path, inline_max_bytes=16)
+    assert not (tmp_path / "blobs" / "stray.blob").exists()
+    assert (await reopened.get("big.bin")).data == b"x" * 100
+    await reopened.aclose()
@@ -1,3 +1,5 @@
+import hashlib
+
 import pytest
 from backend.app.storage import MemoryStore
 
@@ -8,3 +10,51 @@ async def test_memory_store_roundtrip():
     await s.save("a.txt", "text/plain", b"hi")
     files = await s.list()
     assert files[0].name == "a.txt" and files[0].size == 2
+
+
+@pytest.mark.asyncio
+async def test_memory_store_digest_index():
+    s = MemoryStore()
+    digest = hashlib.sha256(b"hi").hexdigest()
+    saved = await s.save("a.txt", "text/plain", b"hi")
+    assert saved.sha256 == digest
+    assert await s.has_digests([digest, "0" * 64]) == [digest]
+    await s.save("a.txt", "text/plain", b"changed")
+    assert await s.has_digests([digest]) == []
+
+
+@pytest.mark.asyncio
+async def test_memory_store_version_bumps_on_mutation():
+    s = MemoryStore()
+    v0 = s.version
+    await s.save("a.txt", "text/plain", b"hi")
+    v1 = s.version
+    await s.get("a.txt")
+    await s.list()
+    assert s.version == v1 > v0
+    assert not await s.delete("missing.txt")
+    assert s.version == v1
+    assert await s.delete("a.txt")
+    v2 = s.version
+    await s.clear()
+    assert s.version > v2 > v1
+
+
+@pytest.mark.asyncio
+async def test_memory_store_link_reuses_data():
+    s = MemoryStore()
+    saved = await s.save("a.txt", "text/plain", b"hi")
+    info = await s.link("b.txt", hashlib.sha256(b"hi").hexdigest())
+    assert info.name == "b.txt" and info.content_type == "text/plain"
+    assert (await s.get("b.txt")).data is saved.data
+    assert await s.link("c.txt", "0" * 64) is None
+
+
+@pytest.mark.asyncio
+async def test_memory_store_link_onto_same_name_keeps_index():
+    s = MemoryStore()
+    digest = hashlib.sha256(b"hi").hexdigest()
+    await s.save("a.txt", "text/plain", b"hi")
+    assert (await s.link("a.txt", digest)).name == "a.txt"
+    assert await s.has_digests([digest]) == [digest]
+    assert (await s.link("b.txt", digest)).size == 2
@@ -0,0 +1,47 @@
+import json
+
+from app.tracing import JsonLinesExporter, RingBufferExporter, SpanContext, Tracer
+
+
+def test_span_context_parse_and_format():
+    tp = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+    ctx = SpanContext.parse(tp)
+    assert ctx is not None and ctx.traceparent() == tp
+    assert SpanContext.parse(None) is None
+    assert SpanContext.parse("garbage") is None
+    assert SpanContext.parse("00-" + "0" * 32 + "-00f067aa0ba902b7-01") is None
+
+
+def test_tracer_nests_children_and_exports_on_root_end(tmp_path):
+    ring = RingBufferExporter(capacity=2)
+    path = tmp_path / "spans.jsonl"
+    jsonl = JsonLinesExporter(path)
+    t = Tracer([ring, jsonl])
+    parent = SpanContext.parse("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01")
+
+    with t.span("root", parent=parent) as root:
+        with t.span("child") as child:
+            pass
+        assert ring.slowest() == []
+
+    jsonl.close()
+    (trace,) = ring.slowest()
+    assert [s.name for s in trace] == ["root", "child"]
+    assert root.context.trace_id == parent.trace_id
+    assert root.parent_id == parent.span_id
+    assert child.parent_id == root.context.span_id
+    assert root.context.span_id != "0" * 16
+    assert jsonl.dropped == 0
+    lines = [json.loads(x) for x in path.read_text().splitlines()]
+    assert [x["name"] for x in lines] == ["root", "child"]
+
+
+def test_ring_buffer_filters_and_orders_by_duration():
+    ring = RingBufferExporter(capacity=2)
+    t = Tracer([ring])
+    for name in ["a", "b", "c"]:
+        with t.span(name) as sp:
+            pass
+        sp.duration_ms = {"a": 5.0, "b": 1.0, "c": 9.0}[name]
+    assert [tr[0].name for tr in ring.slowest()] == ["c", "b"]
+    assert [tr[0].name for tr in ring.slowest(min_duration_ms=2)] == ["c"]
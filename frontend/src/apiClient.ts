@@ -1,5 +1,17 @@
+import { hashFile } from "./lib/hash";
+
 const API_BASE = process.env.NEXT_PUBLIC_API_BASE!;
 
+type FileInfo = {
+  name: string;
+  size: number;
+  content_type: string;
+  uploaded_at: number;
+  sha256?: string | null;
+};
+
+type UploadResult = { ok: boolean; file: FileInfo };
+
 export async function listFiles(signal?: AbortSignal) {
   const r = await fetch(`${API_BASE}/files`, {
     method: "GET",
@@ -9,39 +21,134 @@ export async function listFiles(signal?: AbortSignal) {
   if (!r.ok) throw new Error(`List failed: ${r.status}`);
   return (await r.json()) as {
     ok: boolean;
-    files: Array<{
-      name: string;
-      size: number;
-      content_type: string;
-      uploaded_at: number;
-    }>;
+    files: Array<FileInfo>;
   };
 }
 
-export async function uploadFile(
-  file: File,
-  onProgress?: (pct: number) => void,
+export async function probeDigests(digests: string[], signal?: AbortSignal) {
+  const r = await fetch(`${API_BASE}/files/probe`, {
+    method: "POST",
+    body: JSON.stringify({ digests }),
+    headers: {
+      "content-type": "application/json",
+      "x-request-id": crypto.randomUUID().replace(/-/g, ""),
+    },
+    signal,
+  });
+  if (!r.ok) throw new Error(`Probe failed: ${r.status}`);
+  return (await r.json()) as { ok: boolean; present: string[] };
+}
+
+/** Create `name` from content the server already holds; null if it no longer has it. */
+export async function linkFile(
+  name: string,
+  sha256: string,
+  contentType?: string,
   signal?: AbortSignal,
 ) {
-  const fd = new FormData();
-  fd.set("file", file, file.name);
-  const r = await fetch(`${API_BASE}/upload`, {
+  const r = await fetch(`${API_BASE}/files/link`, {
     method: "POST",
-    body: fd,
+    body: JSON.stringify({ name, sha256, content_type: contentType || null }),
     headers: {
+      "content-type": "application/json",
       "x-request-id": crypto.randomUUID().replace(/-/g, ""),
       "x-csrf-token": "dev",
     },
     signal,
   });
-  if (!r.ok) throw new Error(`Upload failed: ${r.status}`);
-  return (await r.json()) as {
-    ok: boolean;
-    file: {
-      name: string;
-      size: number;
-      content_type: string;
-      uploaded_at: number;
+  if (r.status === 404) return null;
+  if (!r.ok) throw new Error(`Link failed: ${r.status}`);
+  return (await r.json()) as UploadResult;
+}
+
+export class UploadError extends Error {
+  constructor(
+    public status: number,
+    public retryAfterMs: number | null = null,
+  ) {
+    super(`Upload failed: ${status}`);
+  }
+}
+
+/** Retry-After as milliseconds; accepts delta-seconds or an HTTP date. */
+function parseRetryAfter(value: string | null): number | null {
+  if (!value) return null;
+  const secs = Number(value);
+  if (Number.isFinite(secs)) return Math.max(0, secs * 1000);
+  const at = Date.parse(value);
+  return Number.isNaN(at) ? null : Math.max(0, at - Date.now());
+}
+
+// XHR rather than fetch: fetch has no upload progress events
+export function sendUpload(
+  file: File,
+  onProgress?: (pct: number) => void,
+  signal?: AbortSignal,
+) {
+  return new Promise<UploadResult>((resolve, reject) => {
+    if (signal?.aborted) {
+      reject(new DOMException("Upload aborted", "AbortError"));
+      return;
+    }
+    const fd = new FormData();
+    fd.set("file", file, file.name);
+    const xhr = new XMLHttpRequest();
+    xhr.open("POST", `${API_BASE}/upload`);
+    xhr.setRequestHeader("x-request-id", crypto.randomUUID().replace(/-/g, ""));
+    xhr.setRequestHeader("x-csrf-token", "dev");
+    xhr.responseType = "json";
+    xhr.upload.onprogress = (e) => {
+      // hold at 99% until the server has stored the file
+      if (e.lengthComputable)
+        onProgress?.(Math.min(99, (e.loaded / e.total) * 100));
     };
-  };
+    xhr.onload = () => {
+      if (xhr.status >= 200 && xhr.status < 300) {
+        onProgress?.(100);
+        resolve(xhr.response as UploadResult);
+      } else {
+        const retryAfter = parseRetryAfter(
+          xhr.getResponseHeader("Retry-After"),
+        );
+        reject(new UploadError(xhr.status, retryAfter));
+      }
+    };
+    xhr.onerror = () => reject(new UploadError(0));
+    xhr.onabort = () =>
+      reject(new DOMException("Upload aborted", "AbortError"));
+    signal?.addEventListener("abort", () => xhr.abort(), { once: true });
+    xhr.send(fd);
+  });
+}
+
+/**
+ * Best-effort upload skip: hash the file, probe the server and link existing
+ * content. Any failure other than cancellation (hashing, network, non-2xx,
+ * older server without the endpoints) returns null so the caller uploads.
+ */
+export async function linkExisting(file: File, signal?: AbortSignal) {
+  try {
+    const sha256 = await hashFile(file);
+    if (!sha256) return null;
+    const { present } = await probeDigests([sha256], signal);
+    if (!present.includes(sha256)) return null;
+    return await linkFile(file.name, sha256, file.type, signal);
+  } catch (e) {
+    if (e instanceof DOMException && e.name === "AbortError") throw e;
+    return null;
+  }
+}
+
+export async function uploadFile(
+  file: File,
+  onProgress?: (pct: number) => void,
+  signal?: AbortSignal,
+) {
+  // skip the body transfer when the server already has byte-identical content
+  const linked = await linkExisting(file, signal);
+  if (linked) {
+    onProgress?.(100);
+    return linked;
+  }
+  return sendUpload(file, onProgress, signal);
 }
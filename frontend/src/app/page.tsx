@@ -4,7 +4,8 @@ import { useQuery, useQueryClient } from "@tanstack/react-query";
 import UploadDropzone from "../components/UploadDropzone";
 import ProgressItem from "../components/ProgressItem";
 import FileTable from "../components/FileTable";
-import { listFiles, uploadFile } from "../apiClient";
+import { listFiles } from "../apiClient";
+import { UploadQueue, UploadTask } from "../lib/uploadQueue";
 
 export default function Page() {
   const qc = useQueryClient();
@@ -13,38 +14,44 @@ export default function Page() {
     queryFn: () => listFiles(),
   });
 
-  const [inFlight, setInFlight] = React.useState<
-    Array<{ name: string; progress: number; abort: AbortController }>
-  >([]);
+  const [inFlight, setInFlight] = React.useState<UploadTask[]>([]);
 
-  async function doUpload(files: File[]) {
-    for (const f of files) {
-      const abort = new AbortController();
-      setInFlight((x) => [...x, { name: f.name, progress: 0, abort }]);
-      try {
-        await uploadFile(f, undefined, abort.signal);
-        await qc.invalidateQueries({ queryKey: ["files"] });
-      } catch (e) {
-        console.error(e);
-        alert(`Upload failed: ${f.name}`);
-      } finally {
-        setInFlight((x) => x.filter((i) => i.name !== f.name));
-      }
-    }
+  const queueRef = React.useRef<UploadQueue | null>(null);
+  if (!queueRef.current) {
+    queueRef.current = new UploadQueue({
+      onChange: (task) => {
+        if (task.status === "error") {
+          console.error(task.error);
+          alert(`Upload failed: ${task.name}`);
+        }
+        const finished = ["done", "error", "cancelled"].includes(task.status);
+        setInFlight((x) =>
+          finished
+            ? x.filter((i) => i.id !== task.id)
+            : x.some((i) => i.id === task.id)
+              ? x.map((i) => (i.id === task.id ? task : i))
+              : [...x, task],
+        );
+      },
+      onUploaded: () => qc.invalidateQueries({ queryKey: ["files"] }),
+    });
   }
 
+  React.useEffect(() => () => queueRef.current?.cancelAll(), []);
+
   return (
     <div className="grid">
-      <UploadDropzone onFiles={doUpload} busy={inFlight.length > 0} />
+      <UploadDropzone
+        onFiles={(files) => queueRef.current?.add(files)}
+        busy={inFlight.length > 0}
+      />
       {inFlight.map((item) => (
         <ProgressItem
-          key={item.name}
+          key={item.id}
           fileName={item.name}
           progress={item.progress}
-          onCancel={() => {
-            item.abort.abort();
-            setInFlight((x) => x.filter((i) => i.name !== item.name));
-          }}
+          status={item.status}
+          onCancel={() => queueRef.current?.cancel(item.id)}
         />
       ))}
       {isLoading ? (
@@ -4,12 +4,15 @@ import React from "react";
 export default function ProgressItem({
   fileName,
   progress,
+  status,
   onCancel,
 }: {
   fileName: string;
   progress: number;
+  status?: string;
   onCancel: () => void;
 }) {
+  const pct = Math.round(progress);
   return (
     <div className="card" aria-live="polite">
       <div
@@ -20,12 +23,26 @@ export default function ProgressItem({
         }}
       >
         <strong>{fileName}</strong>
+        <span style={{ color: "var(--muted)" }}>
+          {status === "queued"
+            ? "Queued"
+            : status === "retrying"
+              ? "Server busy, retrying…"
+              : `${pct}%`}
+        </span>
         <button onClick={onCancel} aria-label={`Cancel upload for ${fileName}`}>
           Cancel
         </button>
       </div>
-      <div className="progress">
-        <div style={{ width: `${progress}%` }} />
+      <div
+        className="progress"
+        role="progressbar"
+        aria-label={`Upload progress for ${fileName}`}
+        aria-valuemin={0}
+        aria-valuemax={100}
+        aria-valuenow={pct}
+      >
+        <div style={{ width: `${pct}%` }} />
       </div>
     </div>
   );
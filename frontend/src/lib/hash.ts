@@ -0,0 +1,39 @@
+const WORKER_THRESHOLD_BYTES = 1024 * 1024;
+
+export function toHex(buf: ArrayBuffer): string {
+  return Array.from(new Uint8Array(buf), (b) =>
+    b.toString(16).padStart(2, "0"),
+  ).join("");
+}
+
+function hashInWorker(file: File): Promise<string> {
+  return new Promise((resolve, reject) => {
+    const worker = new Worker(new URL("./hash.worker.ts", import.meta.url));
+    worker.onmessage = (
+      e: MessageEvent<{ sha256?: string; error?: string }>,
+    ) => {
+      worker.terminate();
+      if (e.data.sha256) resolve(e.data.sha256);
+      else reject(new Error(e.data.error || "hash failed"));
+    };
+    worker.onerror = (e) => {
+      worker.terminate();
+      reject(new Error(e.message));
+    };
+    worker.postMessage(file);
+  });
+}
+
+/**
+ * Hex SHA-256 of a file via WebCrypto, hashed in a worker for large files.
+ * Returns null where WebCrypto is unavailable (non-secure contexts).
+ */
+export async function hashFile(file: File): Promise<string | null> {
+  if (!globalThis.crypto?.subtle) return null;
+  if (file.size >= WORKER_THRESHOLD_BYTES && typeof Worker !== "undefined") {
+    return hashInWorker(file);
+  }
+  return toHex(
+    await crypto.subtle.digest("SHA-256", await file.arrayBuffer()),
+  );
+}
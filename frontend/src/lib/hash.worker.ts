@@ -0,0 +1,14 @@
+import { toHex } from "./hash";
+
+// Hashes large files off the main thread so drag & drop stays responsive.
+self.onmessage = async (e: MessageEvent<File>) => {
+  try {
+    const digest = await crypto.subtle.digest(
+      "SHA-256",
+      await e.data.arrayBuffer(),
+    );
+    self.postMessage({ sha256: toHex(digest) });
+  } catch (err) {
+    self.postMessage({ error: String(err) });
+  }
+};
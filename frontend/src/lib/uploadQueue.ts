@@ -0,0 +1,251 @@
+import { UploadError, linkExisting, sendUpload } from "../apiClient";
+
+export type UploadStatus =
+  | "queued"
+  | "uploading"
+  | "retrying"
+  | "done"
+  | "error"
+  | "cancelled";
+
+export type UploadTask = {
+  id: string;
+  name: string;
+  size: number;
+  progress: number;
+  status: UploadStatus;
+  error?: string;
+};
+
+type Options = {
+  onChange: (task: UploadTask) => void;
+  onUploaded?: (task: UploadTask) => void;
+  minConcurrency?: number;
+  maxConcurrency?: number;
+  initialConcurrency?: number;
+  maxAttempts?: number;
+  baseBackoffMs?: number;
+  maxBackoffMs?: number;
+};
+
+type Job = { task: UploadTask; file: File; abort: AbortController };
+
+function isAbort(e: unknown) {
+  return e instanceof DOMException && e.name === "AbortError";
+}
+
+function sleep(ms: number, signal: AbortSignal) {
+  return new Promise<void>((resolve, reject) => {
+    const t = setTimeout(resolve, ms);
+    signal.addEventListener(
+      "abort",
+      () => {
+        clearTimeout(t);
+        reject(new DOMException("Upload aborted", "AbortError"));
+      },
+      { once: true },
+    );
+  });
+}
+
+/**
+ * Client-side upload scheduler.
+ * - Bounded worker pool; parallelism climbs while measured throughput keeps
+ *   improving and backs off when it drops.
+ * - 503s are retried after Retry-After plus jittered exponential backoff,
+ *   halve the parallelism and pause new starts for the whole pool.
+ * - Byte-level progress per task; queued or running tasks can be cancelled.
+ */
+export class UploadQueue {
+  private pending: Job[] = [];
+  private running = new Map<string, Job>();
+  private concurrency: number;
+  private pausedUntil = 0;
+  private wakeTimer: ReturnType<typeof setTimeout> | null = null;
+  // throughput sampling: bytes finished in the current window at `concurrency`
+  private windowStart = 0;
+  private windowBytes = 0;
+  private windowCount = 0;
+  private lastThroughput = 0;
+  private lastStep = 1;
+  private readonly min: number;
+  private readonly max: number;
+  private readonly maxAttempts: number;
+  private readonly baseBackoffMs: number;
+  private readonly maxBackoffMs: number;
+
+  constructor(private readonly opts: Options) {
+    this.min = opts.minConcurrency ?? 1;
+    this.max = opts.maxConcurrency ?? 6;
+    this.concurrency = opts.initialConcurrency ?? 2;
+    this.maxAttempts = opts.maxAttempts ?? 5;
+    this.baseBackoffMs = opts.baseBackoffMs ?? 500;
+    this.maxBackoffMs = opts.maxBackoffMs ?? 30_000;
+  }
+
+  get parallelism() {
+    return this.concurrency;
+  }
+
+  add(files: File[]): UploadTask[] {
+    const tasks = files.map((file) => {
+      const task: UploadTask = {
+        id: crypto.randomUUID(),
+        name: file.name,
+        size: file.size,
+        progress: 0,
+        status: "queued",
+      };
+      this.pending.push({ task, file, abort: new AbortController() });
+      this.emit(task);
+      return task;
+    });
+    this.pump();
+    return tasks;
+  }
+
+  cancel(id: string) {
+    const idx = this.pending.findIndex((j) => j.task.id === id);
+    if (idx >= 0) {
+      const [job] = this.pending.splice(idx, 1);
+      this.finish(job, "cancelled");
+      return;
+    }
+    this.running.get(id)?.abort.abort();
+  }
+
+  cancelAll() {
+    for (const job of [...this.pending]) this.cancel(job.task.id);
+    for (const id of [...this.running.keys()]) this.cancel(id);
+  }
+
+  private emit(task: UploadTask) {
+    this.opts.onChange({ ...task });
+  }
+
+  private finish(job: Job, status: UploadStatus, error?: string) {
+    job.task.status = status;
+    job.task.error = error;
+    this.running.delete(job.task.id);
+    this.emit(job.task);
+  }
+
+  private pump() {
+    const wait = this.pausedUntil - Date.now();
+    if (wait > 0) {
+      if (!this.wakeTimer) {
+        this.wakeTimer = setTimeout(() => {
+          this.wakeTimer = null;
+          this.pump();
+        }, wait);
+      }
+      return;
+    }
+    while (this.running.size < this.concurrency && this.pending.length) {
+      const job = this.pending.shift()!;
+      // a window starts when transfers start, not at the first completion
+      if (!this.running.size && !this.windowCount) this.resetWindow();
+      this.running.set(job.task.id, job);
+      void this.run(job).finally(() => {
+        this.running.delete(job.task.id);
+        this.pump();
+      });
+    }
+  }
+
+  private complete(job: Job, transferred: boolean) {
+    job.task.progress = 100;
+    // linked jobs send no body; counting them would inflate throughput
+    if (transferred) this.recordThroughput(job.file.size);
+    this.finish(job, "done");
+    this.opts.onUploaded?.({ ...job.task });
+  }
+
+  private async run(job: Job) {
+    const { task, file, abort } = job;
+    task.status = "uploading";
+    this.emit(task);
+    // hash + probe once per job; only the body transfer is retried below
+    try {
+      if (await linkExisting(file, abort.signal)) {
+        return this.complete(job, false);
+      }
+    } catch {
+      return this.finish(job, "cancelled");
+    }
+    for (let attempt = 0; ; attempt++) {
+      task.status = "uploading";
+      task.progress = 0;
+      this.emit(task);
+      try {
+        await sendUpload(
+          file,
+          (pct) => {
+            task.progress = pct;
+            this.emit(task);
+          },
+          abort.signal,
+        );
+        return this.complete(job, true);
+      } catch (e) {
+        if (isAbort(e)) return this.finish(job, "cancelled");
+        const retryable =
+          e instanceof UploadError && (e.status === 503 || e.status === 0);
+        if (!retryable || attempt + 1 >= this.maxAttempts) {
+          return this.finish(job, "error", String(e));
+        }
+        const delay = this.backoff(attempt, (e as UploadError).retryAfterMs);
+        if ((e as UploadError).status === 503) this.onBackpressure(delay);
+        task.status = "retrying";
+        this.emit(task);
+        try {
+          await sleep(delay, abort.signal);
+        } catch {
+          return this.finish(job, "cancelled");
+        }
+      }
+    }
+  }
+
+  /** Retry-After floor plus full-jitter exponential backoff. */
+  private backoff(attempt: number, retryAfterMs: number | null) {
+    const cap = Math.min(this.maxBackoffMs, this.baseBackoffMs * 2 ** attempt);
+    return (retryAfterMs ?? 0) + Math.random() * cap;
+  }
+
+  private onBackpressure(delayMs: number) {
+    this.concurrency = Math.max(this.min, Math.floor(this.concurrency / 2));
+    this.pausedUntil = Math.max(this.pausedUntil, Date.now() + delayMs);
+    this.lastStep = -1;
+    this.resetWindow();
+  }
+
+  private resetWindow() {
+    this.windowStart = performance.now();
+    this.windowBytes = 0;
+    this.windowCount = 0;
+  }
+
+  /**
+   * Hill-climb parallelism: after each window of `concurrency` completions,
+   * keep stepping in the same direction while throughput improves, reverse
+   * when it gets worse.
+   */
+  private recordThroughput(bytes: number) {
+    this.windowBytes += bytes;
+    this.windowCount += 1;
+    if (this.windowCount < this.concurrency) return;
+    const elapsed = performance.now() - this.windowStart;
+    const throughput = this.windowBytes / Math.max(elapsed, 1);
+    if (this.lastThroughput && throughput < this.lastThroughput * 0.9) {
+      this.lastStep = -this.lastStep;
+    }
+    this.lastThroughput = throughput;
+    this.concurrency = Math.min(
+      this.max,
+      Math.max(this.min, this.concurrency + this.lastStep),
+    );
+    this.resetWindow();
+    this.pump();
+  }
+}